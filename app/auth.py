@@ -1,55 +1,171 @@
 # app/auth.py
+import asyncio
 from fastapi import Depends, HTTPException, status, Request
+from sqlalchemy import bindparam, select, delete, func
 from sqlalchemy.orm import Session
 import bcrypt
+import hashlib
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError, VerifyMismatchError
 import secrets
+import threading
+from cachetools import TTLCache
 from datetime import datetime, timedelta
 from typing import Optional
 from app.db.models import get_db, User, Session as SessionModel
+from app.cache import get_cached_session, cache_session, invalidate_session
+from app.config import ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM
+
+# Размер пачки при удалении истёкших сессий
+CLEANUP_BATCH_SIZE = 1000
+
+# Argon2id: без ограничения bcrypt в 72 байта, memory-hard, отпускает GIL
+_PASSWORD_HASHER = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+
+# Настоящий хеш для проверки пароля несуществующего пользователя.
+# Считается один раз при загрузке модуля; параметры совпадают с реальными хешами
+_DUMMY_HASH = _PASSWORD_HASHER.hash("dummy-password")
+
+# Кэш неудачных входов: повтор той же неверной пары логин/пароль не пересчитывает KDF.
+# Ключ включает текущий хеш пароля, поэтому после регистрации или смены пароля запись не действует
+FAILED_LOGIN_CACHE_SIZE = 10_000
+FAILED_LOGIN_CACHE_TTL = 60
+_failed_logins: TTLCache = TTLCache(maxsize=FAILED_LOGIN_CACHE_SIZE, ttl=FAILED_LOGIN_CACHE_TTL)
+_failed_logins_lock = threading.Lock()
+# Секрет процесса для ключей кэша: по ключам нельзя перебором восстановить пароли
+_FAILED_LOGIN_KEY_SECRET = secrets.token_bytes(32)
+
+# Формат bcrypt-хеша (устаревшие хеши до перехода на Argon2id): префикс версии и фиксированная длина
+_BCRYPT_PREFIXES = (b"$2a$", b"$2b$", b"$2y$")
+_BCRYPT_HASH_LENGTH = 60
+
+
+def _password_bytes(password: str) -> bytes:
+    """Пароль в байтах с учётом ограничения bcrypt (не длиннее 72 байт)"""
+    return password.encode('utf-8')[:72]
+
+
+def _is_bcrypt_hash(hashed_password: bytes) -> bool:
+    """Проверка формата bcrypt-хеша без раннего выхода (constant-time сравнение префикса)"""
+    prefix_ok = False
+    for prefix in _BCRYPT_PREFIXES:
+        prefix_ok |= secrets.compare_digest(hashed_password[:4], prefix)
+    return prefix_ok & (len(hashed_password) == _BCRYPT_HASH_LENGTH)
+
+
+def _verify_dummy(plain_password: str) -> bool:
+    """Та же работа, что и при обычной неудачной проверке; всегда False"""
+    try:
+        _PASSWORD_HASHER.verify(_DUMMY_HASH, plain_password)
+    except VerificationError:
+        pass
+    return False
+
+
+def _verify_bcrypt(plain_password: str, hashed_password: str) -> bool:
+    """Проверка устаревшего bcrypt-хеша"""
+    hashed_bytes = hashed_password.encode('utf-8')
+    if not _is_bcrypt_hash(hashed_bytes):
+        return _verify_dummy(plain_password)
+    
+    try:
+        return bcrypt.checkpw(_password_bytes(plain_password), hashed_bytes)
+    except ValueError:
+        # Формат верный, но соль повреждена — bcrypt падает до хеширования
+        return _verify_dummy(plain_password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверка пароля"""
+    """Проверка пароля (Argon2id или устаревший bcrypt)"""
+    if hashed_password.startswith("$2"):
+        return _verify_bcrypt(plain_password, hashed_password)
+    
     try:
-        # Проверяем пароль с помощью bcrypt
-        return bcrypt.checkpw(
-            plain_password.encode('utf-8'),
-            hashed_password.encode('utf-8')
-        )
-    except Exception:
+        return _PASSWORD_HASHER.verify(hashed_password, plain_password)
+    except VerifyMismatchError:
         return False
+    except (InvalidHashError, VerificationError):
+        # Для повреждённого хеша выполняем ту же работу, что и при обычной неудачной проверке
+        return _verify_dummy(plain_password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Нужно ли перехешировать пароль (bcrypt или Argon2id с устаревшими параметрами)"""
+    if hashed_password.startswith("$2"):
+        return True
+    return _PASSWORD_HASHER.check_needs_rehash(hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Хеширование пароля"""
-    # Ограничение bcrypt: пароль не должен быть длиннее 72 байта
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    
-    # Генерируем соль и хешируем пароль
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    """Хеширование пароля (Argon2id)"""
+    return _PASSWORD_HASHER.hash(password)
+
+
+def _failed_login_key(username: str, password: str, password_hash: str) -> bytes:
+    """Ключ кэша неудачных входов (keyed BLAKE2b, пароль в открытом виде не хранится)"""
+    digest = hashlib.blake2b(key=_FAILED_LOGIN_KEY_SECRET, digest_size=16)
+    digest.update(password_hash.encode('utf-8'))
+    for part in (username, password):
+        data = part.encode('utf-8')
+        digest.update(len(data).to_bytes(4, "big"))
+        digest.update(data)
+    return digest.digest()
 
 
-def authenticate_user(db: Session, username: str, password: str):
+async def authenticate_user(db: Session, username: str, password: str):
     """Аутентификация пользователя с защитой от timing attacks"""
     # Всегда выполняем проверку пароля, даже если пользователь не найден
     # Это защищает от timing attacks (утечки информации о существовании пользователя)
-    dummy_hash = "$2b$12$" + "0" * 53  # Dummy bcrypt hash для постоянного времени выполнения
-    
     user = db.query(User).filter(User.username == username).first()
-    password_hash = user.password_hash if user else dummy_hash
+    password_hash = user.password_hash if user else _DUMMY_HASH
+    
+    # Повтор недавней неудачной попытки отклоняем без KDF. Имя пользователя входит в ключ,
+    # поэтому для существующих и несуществующих пользователей поведение одинаковое
+    failed_key = _failed_login_key(username, password, password_hash)
+    with _failed_logins_lock:
+        if failed_key in _failed_logins:
+            return False
     
-    # Всегда проверяем пароль для постоянного времени выполнения
-    is_valid = verify_password(password, password_hash)
+    # Всегда проверяем пароль для постоянного времени выполнения.
+    # Хеширование выполняется в потоке (отпускает GIL), чтобы не блокировать event loop
+    is_valid = await asyncio.to_thread(verify_password, password, password_hash)
     
     if not user or not is_valid:
+        with _failed_logins_lock:
+            _failed_logins[failed_key] = True
         return False
+    
+    # Постепенная миграция: при успешном входе переводим bcrypt-хеш на Argon2id
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await asyncio.to_thread(get_password_hash, password)
+        db.commit()
     return user
 
 
+def hash_session_token(session_token: str) -> bytes:
+    """SHA-256 токена сессии: в БД и кэше хранится только хеш, сам токен — только в cookie"""
+    return hashlib.sha256(session_token.encode('utf-8')).digest()
+
+
+# Запросы горячего пути собираются один раз при импорте; значения передаются через bindparam,
+# поэтому скомпилированный SQL каждый раз берётся из кэша движка без построения запроса заново
+_SESSION_USER_STMT = select(User, SessionModel.expires_at, SessionModel.csrf_token).join(
+    SessionModel, SessionModel.user_id == User.id
+).where(
+    SessionModel.session_token_hash == bindparam("token_hash"),
+    SessionModel.expires_at > func.now()
+)
+
+_CSRF_TOKEN_STMT = select(SessionModel.csrf_token).where(
+    SessionModel.session_token_hash == bindparam("token_hash"),
+    SessionModel.expires_at > func.now()
+)
+
+
 def create_session(db: Session, user_id: int, days: int = 30) -> tuple[str, str]:
     """Создать новую сессию для пользователя. Возвращает (session_token, csrf_token)"""
     # Генерируем безопасный токен сессии
@@ -59,34 +175,49 @@ def create_session(db: Session, user_id: int, days: int = 30) -> tuple[str, str]
     # Создаём сессию в БД
     expires_at = datetime.utcnow() + timedelta(days=days)
     session = SessionModel(
-        session_token=session_token,
+        session_token_hash=hash_session_token(session_token),
         user_id=user_id,
         csrf_token=csrf_token,
         expires_at=expires_at
     )
     db.add(session)
     db.commit()
-    db.refresh(session)
     
     return session_token, csrf_token
 
 
 def get_session_user(db: Session, session_token: str) -> User | None:
-    """Получить пользователя по токену сессии"""
+    """Получить пользователя по токену сессии (сначала из кэша, затем из БД)"""
     if not session_token:
         return None
     
-    # Ищем активную сессию
-    session = db.query(SessionModel).filter(
-        SessionModel.session_token == session_token,
-        SessionModel.expires_at > datetime.utcnow()
-    ).first()
+    token_hash = hash_session_token(session_token)
+    
+    # Кэш хранит только то, что нужно роутам, поэтому собираем облегчённый User без обращения к БД
+    cached = get_cached_session(token_hash)
+    if cached:
+        return User(id=cached["user_id"], username=cached["username"])
     
-    if not session:
+    # Ищем пользователя активной сессии одним запросом (JOIN)
+    row = db.execute(_SESSION_USER_STMT, {"token_hash": token_hash}).first()
+    
+    if not row:
         return None
     
-    # Возвращаем пользователя
-    return db.query(User).filter(User.id == session.user_id).first()
+    user, expires_at, csrf_token = row
+    
+    # Кэшируем сессию до момента её истечения
+    cache_session(
+        token_hash,
+        {
+            "user_id": user.id,
+            "username": user.username,
+            "expires_at": expires_at.isoformat(),
+            "csrf_token": csrf_token,
+        },
+        expires_at
+    )
+    return user
 
 
 def delete_session(db: Session, session_token: str) -> None:
@@ -94,21 +225,30 @@ def delete_session(db: Session, session_token: str) -> None:
     if not session_token:
         return
     
-    session = db.query(SessionModel).filter(
-        SessionModel.session_token == session_token
-    ).first()
+    token_hash = hash_session_token(session_token)
+    db.query(SessionModel).filter(
+        SessionModel.session_token_hash == token_hash
+    ).delete(synchronize_session=False)
+    db.commit()
     
-    if session:
-        db.delete(session)
-        db.commit()
+    invalidate_session(token_hash)
 
 
 def cleanup_expired_sessions(db: Session) -> None:
-    """Очистить истёкшие сессии"""
-    db.query(SessionModel).filter(
-        SessionModel.expires_at <= datetime.utcnow()
-    ).delete()
-    db.commit()
+    """Очистить истёкшие сессии (bulk DELETE пачками)"""
+    # Удаляем пачками, чтобы не держать блокировку записи SQLite долго
+    expired_ids = select(SessionModel.id).where(
+        SessionModel.expires_at <= func.now()
+    ).limit(CLEANUP_BATCH_SIZE)
+    
+    while True:
+        result = db.execute(
+            delete(SessionModel).where(SessionModel.id.in_(expired_ids)),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        if result.rowcount < CLEANUP_BATCH_SIZE:
+            break
 
 
 def get_current_user(request: Request, db: Session = Depends(get_db)):
@@ -136,33 +276,36 @@ def generate_csrf_token(db: Session, session_token: str) -> str:
     """Генерировать CSRF токен для сессии и сохранить в БД"""
     csrf_token = secrets.token_urlsafe(32)
     
-    # Обновляем CSRF токен в БД
-    session = db.query(SessionModel).filter(
-        SessionModel.session_token == session_token,
-        SessionModel.expires_at > datetime.utcnow()
-    ).first()
+    token_hash = hash_session_token(session_token)
+    
+    # Обновляем CSRF токен в БД одним UPDATE
+    updated = db.query(SessionModel).filter(
+        SessionModel.session_token_hash == token_hash,
+        SessionModel.expires_at > func.now()
+    ).update({SessionModel.csrf_token: csrf_token}, synchronize_session=False)
     
-    if session:
-        session.csrf_token = csrf_token
+    if updated:
         db.commit()
+        invalidate_session(token_hash)
     
     return csrf_token
 
 
+def _stored_csrf_token(db: Session, token_hash: bytes) -> Optional[str]:
+    """CSRF токен активной сессии: из кэша сессий, при промахе — из БД"""
+    cached = get_cached_session(token_hash)
+    if cached:
+        return cached["csrf_token"]
+    
+    return db.execute(_CSRF_TOKEN_STMT, {"token_hash": token_hash}).scalar()
+
+
 def get_csrf_token(db: Session, session_token: str) -> Optional[str]:
-    """Получить CSRF токен для сессии из БД"""
+    """Получить CSRF токен для сессии"""
     if not session_token:
         return None
     
-    session = db.query(SessionModel).filter(
-        SessionModel.session_token == session_token,
-        SessionModel.expires_at > datetime.utcnow()
-    ).first()
-    
-    if not session:
-        return None
-    
-    return session.csrf_token
+    return _stored_csrf_token(db, hash_session_token(session_token))
 
 
 def verify_csrf_token(db: Session, session_token: str, csrf_token: str) -> bool:
@@ -170,25 +313,25 @@ def verify_csrf_token(db: Session, session_token: str, csrf_token: str) -> bool:
     if not session_token or not csrf_token:
         return False
     
-    session = db.query(SessionModel).filter(
-        SessionModel.session_token == session_token,
-        SessionModel.expires_at > datetime.utcnow()
-    ).first()
+    # Кэш сессий инвалидируется при смене/удалении CSRF токена и выходе,
+    # поэтому на горячем пути изменяющих запросов обращения к БД нет
+    stored_token = _stored_csrf_token(db, hash_session_token(session_token))
     
-    if not session or not session.csrf_token:
+    if not stored_token:
         return False
     
     # Используем constant-time сравнение для защиты от timing attacks
-    return secrets.compare_digest(session.csrf_token, csrf_token)
+    return secrets.compare_digest(stored_token, csrf_token)
 
 
 def delete_csrf_token(db: Session, session_token: str) -> None:
     """Удалить CSRF токен при выходе"""
-    session = db.query(SessionModel).filter(
-        SessionModel.session_token == session_token
-    ).first()
+    token_hash = hash_session_token(session_token)
+    updated = db.query(SessionModel).filter(
+        SessionModel.session_token_hash == token_hash
+    ).update({SessionModel.csrf_token: None}, synchronize_session=False)
     
-    if session:
-        session.csrf_token = None
+    if updated:
         db.commit()
+        invalidate_session(token_hash)
 
@@ -0,0 +1,120 @@
+# app/cache.py
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import redis
+from cachetools import TTLCache
+
+from app.config import REDIS_URL
+
+# Префикс ключей кэша сессий в Redis
+SESSION_KEY_PREFIX = "sess:"
+
+# L1: локальный кэш процесса для самых активных токенов (поверх Redis).
+# Инвалидация локальная, поэтому в других воркерах запись живёт не дольше LOCAL_CACHE_TTL
+LOCAL_CACHE_SIZE = 10_000
+LOCAL_CACHE_TTL = 60
+
+# Максимальное время жизни записи в Redis. Запись может вернуться в кэш после выхода
+# (гонка чтения сессии из БД и delete_session), поэтому отзыв сессии вступает в силу
+# не позже чем через REDIS_CACHE_TTL секунд, а не в момент истечения сессии
+REDIS_CACHE_TTL = 300
+
+# Таймауты Redis (секунды). Вызовы синхронные и выполняются в том числе в event loop,
+# поэтому зависший Redis не должен останавливать сервер: после таймаута — RedisError и чтение из БД
+REDIS_SOCKET_TIMEOUT = 0.25
+
+# Клиент Redis (None, если REDIS_URL не задан — тогда кэш отключён).
+# retry=None: без повторных попыток, чтобы таймаут не умножался на число повторов
+redis_client = redis.Redis.from_url(
+    REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    retry=None,
+) if REDIS_URL else None
+
+# хеш токена -> (данные сессии, время истечения сессии в секундах epoch)
+_local_sessions: TTLCache = TTLCache(maxsize=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL)
+# TTLCache не потокобезопасен, а зависимости FastAPI выполняются в пуле потоков
+_local_lock = threading.Lock()
+
+
+def _session_key(token_hash: bytes) -> str:
+    return f"{SESSION_KEY_PREFIX}{token_hash.hex()}"
+
+
+def _expire_timestamp(expires_at: datetime) -> int:
+    """Время истечения сессии (naive UTC, как в БД) в секундах epoch"""
+    return int(expires_at.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _remember_locally(token_hash: bytes, payload: dict, expire_at: int) -> None:
+    with _local_lock:
+        _local_sessions[token_hash] = (payload, expire_at)
+
+
+def get_cached_session(token_hash: bytes) -> Optional[dict]:
+    """Получить данные сессии из кэша: сначала L1, затем Redis (None при промахе)"""
+    with _local_lock:
+        entry = _local_sessions.get(token_hash)
+    if entry:
+        payload, expire_at = entry
+        if time.time() < expire_at:
+            return payload
+        with _local_lock:
+            _local_sessions.pop(token_hash, None)
+
+    if redis_client is None:
+        return None
+
+    try:
+        raw = redis_client.get(_session_key(token_hash))
+    except redis.RedisError as e:
+        logging.warning("Redis недоступен, чтение сессии из БД: %s", e)
+        return None
+
+    if not raw:
+        return None
+
+    payload = json.loads(raw)
+    _remember_locally(
+        token_hash,
+        payload,
+        _expire_timestamp(datetime.fromisoformat(payload["expires_at"]))
+    )
+    return payload
+
+
+def cache_session(token_hash: bytes, payload: dict, expires_at: datetime) -> None:
+    """Сохранить данные сессии в кэш (L1 и Redis) до момента expires_at"""
+    expire_at = _expire_timestamp(expires_at)
+    _remember_locally(token_hash, payload, expire_at)
+
+    if redis_client is None:
+        return
+
+    # Redis сам удалит ключ при истечении сессии или через REDIS_CACHE_TTL (что раньше)
+    redis_expire_at = min(expire_at, int(time.time()) + REDIS_CACHE_TTL)
+    try:
+        redis_client.set(_session_key(token_hash), json.dumps(payload), exat=redis_expire_at)
+    except redis.RedisError as e:
+        logging.warning("Не удалось записать сессию в Redis: %s", e)
+
+
+def invalidate_session(token_hash: bytes) -> None:
+    """Удалить данные сессии из кэша (L1 и Redis)"""
+    with _local_lock:
+        _local_sessions.pop(token_hash, None)
+
+    if redis_client is None:
+        return
+
+    try:
+        redis_client.delete(_session_key(token_hash))
+    except redis.RedisError as e:
+        logging.warning("Не удалось удалить сессию из Redis: %s", e)
@@ -14,7 +14,20 @@ if not N8N_WEBHOOK_URL:
 # В development можно False для работы через HTTP
 COOKIE_SECURE = os.getenv("COOKIE_SECURE", "false").lower() == "true"
 
-# Список путей, которые не требуют CSRF защиты
+# Перечитывать шаблоны и версии статики при изменении файлов (удобно в development).
+# В production установите false: главная страница для гостей рендерится один раз
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "true").lower() == "true"
+
+# Параметры Argon2id для хеширования паролей. Подбираются под железо: ~100 мс на хеш
+# Уже сохранённые хеши содержат свои параметры и продолжают проверяться
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # КиБ (64 МиБ)
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "2"))
+
+# Redis для кэширования сессий (если не задан, сессии читаются напрямую из БД)
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Пути, которые не требуют CSRF защиты (точное совпадение, проверка через set за O(1))
 CSRF_EXEMPT_PATHS = {
     "/api/auth/register",
     "/api/auth/login",
@@ -23,5 +36,9 @@ CSRF_EXEMPT_PATHS = {
     "/api/auth/csrf-token",
     "/api/recipe",  # Публичный эндпоинт генерации рецептов
     "/",
-    "/static",
 }
+
+# Префиксы путей без CSRF защиты (кортеж для str.startswith)
+CSRF_EXEMPT_PREFIXES = (
+    "/static/",
+)
@@ -1,19 +1,25 @@
 # app/db/models.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, inspect, text
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, LargeBinary, ForeignKey, Index, inspect
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from fastapi import Request
 from datetime import datetime, timezone
 import os
 
 Base = declarative_base()
 
 
+def _utcnow() -> datetime:
+    """Текущее время в UTC (вычисляется при каждой вставке/обновлении строки)"""
+    return datetime.now(timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=_utcnow)
 
     recipes = relationship("Recipe", back_populates="owner", cascade="all, delete-orphan")
 
@@ -26,54 +32,99 @@ class Recipe(Base):
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     original_query = Column(String)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=_utcnow)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
 
     owner = relationship("User", back_populates="recipes")
 
+    __table_args__ = (
+        # Список рецептов пользователя (новые первыми) читается по индексу, без сортировки
+        Index("ix_recipes_user_created", "user_id", "created_at"),
+    )
+
 
 class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_token = Column(String, unique=True, index=True, nullable=False)
+    session_token_hash = Column(LargeBinary(32), unique=True, nullable=False)  # SHA-256 токена из cookie
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     csrf_token = Column(String, nullable=True)  # CSRF токен для защиты от CSRF атак
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=_utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
 
     user = relationship("User")
 
+    __table_args__ = (
+        # Покрывающий индекс: поиск активной сессии по токену читает только индекс, без таблицы
+        Index("ix_sessions_covering", "session_token_hash", "expires_at", "user_id", "csrf_token"),
+    )
+
 
 # Путь к БД (в папке db, не в репозитории)
 DB_DIR = os.path.join(os.path.dirname(__file__))
 DB_PATH = os.path.join(DB_DIR, "recipes.db")
 
 # Создаём движок SQLite
-engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+# Пул соединений: одно соединение на запрос, с запасом под параллельные запросы
+engine = create_engine(
+    f"sqlite:///{DB_PATH}",
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+    max_overflow=10,
+    # Кэш скомпилированных запросов с запасом (по умолчанию 500)
+    query_cache_size=1200,
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройка SQLite для каждого нового соединения"""
+    cursor = dbapi_connection.cursor()
+    # WAL: чтение не блокируется записью
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # В режиме WAL NORMAL безопасен и делает fsync только при checkpoint
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 МБ
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 МБ
+    # Ждать освобождения блокировки вместо немедленной ошибки "database is locked"
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
 
 # Создаём сессию
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: после commit атрибуты объектов остаются загруженными,
+# поэтому чтение только что записанной строки не требует повторного SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
 def init_db():
     """Создаёт все таблицы в БД и выполняет миграции"""
-    Base.metadata.create_all(bind=engine)
-    
-    # Миграция: добавление колонки csrf_token в таблицу sessions
+    # Миграция: токены сессий хранятся только в виде SHA-256 (session_token_hash).
+    # Таблица сессий со старой схемой пересоздаётся (в том числе без csrf_token) — пользователи входят заново
     inspector = inspect(engine)
     if 'sessions' in inspector.get_table_names():
         columns = [col['name'] for col in inspector.get_columns('sessions')]
-        if 'csrf_token' not in columns:
-            # Добавляем колонку csrf_token
-            with engine.connect() as conn:
-                conn.execute(text("ALTER TABLE sessions ADD COLUMN csrf_token VARCHAR"))
-                conn.commit()
-            print("Миграция: добавлена колонка csrf_token в таблицу sessions")
+        if 'session_token_hash' not in columns:
+            Session.__table__.drop(bind=engine)
+            print("Миграция: таблица sessions пересоздана с хешированными токенами")
+    
+    Base.metadata.create_all(bind=engine)
+    
+    # Миграция: create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 
-def get_db():
-    """Получить сессию БД"""
+def get_db(request: Request):
+    """Получить сессию БД (общую для всего запроса, если её открыл DBSessionMiddleware)"""
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        # Сессию закрывает middleware после отправки ответа
+        yield db
+        return
+    
     db = SessionLocal()
     try:
         yield db
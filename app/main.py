@@ -1,30 +1,61 @@
 # app/main.py
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-import pathlib
+import logging
+from contextlib import asynccontextmanager
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
 
 from app.db.models import init_db
-from app.middleware import csrf_protection_middleware, cleanup_sessions_middleware
+from app.responses import ORJSONResponse
+from app.middleware import DBSessionMiddleware, csrf_protection_middleware
 from app.routers import home, auth, recipes
+from app.services.recipe_service import init_client, close_client
+from app.static_files import CachedStaticFiles, STATIC_DIR
+from app.tasks import start_session_cleanup, stop_session_cleanup
 
-# Создание приложения FastAPI
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Ресурсы на время жизни приложения: общий HTTP-клиент для n8n и фоновая очистка сессий"""
+    await init_client()
+    await start_session_cleanup()
+    yield
+    await stop_session_cleanup()
+    await close_client()
+
+
+# Создание приложения FastAPI (ответы по умолчанию сериализуются через orjson)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Инициализация БД при старте
 init_db()
 
+
+@app.exception_handler(httpx.HTTPError)
+async def n8n_error_handler(request: Request, exc: httpx.HTTPError):
+    """Ошибка обращения к n8n: 502 с коротким сообщением вместо текста ошибки в рецепте"""
+    logging.warning("Ошибка запроса в n8n: %s", exc)
+    return ORJSONResponse(
+        {"detail": "Сервис генерации рецептов недоступен"},
+        status_code=502
+    )
+
+
+# Сжатие ответов (списки рецептов, HTML, статика); маленькие ответы не сжимаем.
+# Добавляется первым (внутренний слой): @app.middleware отдаёт тело частями,
+# и снаружи от него GZip сжимал бы даже маленькие ответы
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Регистрация middleware (порядок важен: CSRF protection должен быть первым)
 @app.middleware("http")
 async def csrf_middleware(request, call_next):
     return await csrf_protection_middleware(request, call_next)
 
-@app.middleware("http")
-async def cleanup_middleware(request, call_next):
-    return await cleanup_sessions_middleware(request, call_next)
+# Сессия БД на запрос (добавляется последней, чтобы быть внешним слоем вокруг middleware выше)
+app.add_middleware(DBSessionMiddleware)
 
-# Статические файлы
-static_dir = pathlib.Path(__file__).parent / "static"
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+# Статические файлы (с заголовками кэширования)
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
 
 # Регистрация роутеров
 app.include_router(home.router)
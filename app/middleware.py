@@ -1,12 +1,32 @@
 # app/middleware.py
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.responses import ORJSONResponse
 from app.db.models import SessionLocal
 from app.auth import verify_csrf_token
-from app.config import CSRF_EXEMPT_PATHS
+from app.config import CSRF_EXEMPT_PATHS, CSRF_EXEMPT_PREFIXES
 
-# Счетчик для периодической очистки сессий
-_cleanup_counter = 0
+class DBSessionMiddleware:
+    """Одна сессия БД на запрос: общая для middleware и роутов (request.state.db)
+    
+    Чистый ASGI middleware, а не @app.middleware("http"): сессия закрывается только после
+    отправки всего ответа, включая потоковые ответы, которые читают из БД при отправке тела
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        db = SessionLocal()
+        scope.setdefault("state", {})["db"] = db
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            db.close()
 
 
 async def csrf_protection_middleware(request: Request, call_next):
@@ -18,7 +38,7 @@ async def csrf_protection_middleware(request: Request, call_next):
     
     # Проверяем, не является ли путь исключением
     path = request.url.path
-    if any(path.startswith(exempt) for exempt in CSRF_EXEMPT_PATHS):
+    if path in CSRF_EXEMPT_PATHS or path.startswith(CSRF_EXEMPT_PREFIXES):
         response = await call_next(request)
         return response
     
@@ -33,36 +53,12 @@ async def csrf_protection_middleware(request: Request, call_next):
     # Получаем CSRF токен из заголовка
     csrf_token = request.headers.get("X-CSRF-Token")
     
-    # Проверяем CSRF токен через БД
-    db = SessionLocal()
-    try:
-        if not csrf_token or not verify_csrf_token(db, session_token, csrf_token):
-            return JSONResponse(
-                {"detail": "Неверный CSRF токен"},
-                status_code=403
-            )
-    finally:
-        db.close()
-    
-    response = await call_next(request)
-    return response
-
-
-async def cleanup_sessions_middleware(request: Request, call_next):
-    """Очистка истёкших сессий периодически (каждые 100 запросов)"""
-    global _cleanup_counter
-    _cleanup_counter += 1
-    
-    # Очищаем сессии раз в 100 запросов для оптимизации
-    if _cleanup_counter % 100 == 0:
-        from app.auth import cleanup_expired_sessions
-        db = SessionLocal()
-        try:
-            cleanup_expired_sessions(db)
-        except Exception:
-            pass
-        finally:
-            db.close()
+    # Проверяем CSRF токен (сессия БД общая с роутом)
+    if not csrf_token or not verify_csrf_token(request.state.db, session_token, csrf_token):
+        return ORJSONResponse(
+            {"detail": "Неверный CSRF токен"},
+            status_code=403
+        )
     
     response = await call_next(request)
     return response
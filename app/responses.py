@@ -0,0 +1,19 @@
+# app/responses.py
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def dumps(content: Any) -> bytes:
+    """Сериализация в JSON через orjson"""
+    # Даты в БД хранятся в UTC без tzinfo — явно помечаем их как UTC
+    return orjson.dumps(content, option=orjson.OPT_NAIVE_UTC)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON-ответ через orjson: быстрее stdlib json и сериализует datetime сам"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
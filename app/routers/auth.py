@@ -1,6 +1,6 @@
 # app/routers/auth.py
+import asyncio
 from fastapi import APIRouter, Request, Depends, HTTPException
-from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 
@@ -16,6 +16,7 @@ from app.auth import (
     delete_csrf_token
 )
 from app.schemas import UserRegister, UserLogin
+from app.responses import ORJSONResponse
 from app.config import COOKIE_SECURE
 
 router = APIRouter()
@@ -29,19 +30,19 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="Пользователь с таким именем уже существует")
     
-    # Создаём нового пользователя
+    # Создаём нового пользователя (хеширование Argon2id — в потоке, чтобы не блокировать event loop)
+    password_hash = await asyncio.to_thread(get_password_hash, user_data.password)
     new_user = User(
         username=user_data.username,
-        password_hash=get_password_hash(user_data.password)
+        password_hash=password_hash
     )
     db.add(new_user)
     db.commit()
-    db.refresh(new_user)
     
     # Создаём сессию для нового пользователя (возвращает session_token и csrf_token)
     session_token, csrf_token = create_session(db, new_user.id, days=30)
     
-    response = JSONResponse({
+    response = ORJSONResponse({
         "message": "Пользователь успешно зарегистрирован", 
         "username": new_user.username,
         "csrf_token": csrf_token
@@ -71,14 +72,14 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
 @router.post("/api/auth/login")
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """Вход пользователя"""
-    user = authenticate_user(db, user_data.username, user_data.password)
+    user = await authenticate_user(db, user_data.username, user_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Неверное имя пользователя или пароль")
     
     # Создаём сессию для пользователя (возвращает session_token и csrf_token)
     session_token, csrf_token = create_session(db, user.id, days=30)
     
-    response = JSONResponse({
+    response = ORJSONResponse({
         "message": "Успешный вход", 
         "username": user.username,
         "csrf_token": csrf_token
@@ -113,7 +114,7 @@ async def logout(request: Request, db: Session = Depends(get_db)):
         delete_session(db, session_token)
         delete_csrf_token(db, session_token)
     
-    response = JSONResponse({"message": "Выход выполнен"})
+    response = ORJSONResponse({"message": "Выход выполнен"})
     response.delete_cookie(key="session_id")
     response.delete_cookie(key="csrf_token")
     return response
@@ -123,7 +124,7 @@ async def logout(request: Request, db: Session = Depends(get_db)):
 async def get_me(request: Request, user: Optional[User] = Depends(get_current_user), db: Session = Depends(get_db)):
     """Получить информацию о текущем пользователе"""
     if not user:
-        return JSONResponse({"user": None, "csrf_token": None})
+        return ORJSONResponse({"user": None, "csrf_token": None})
     
     session_token = request.cookies.get("session_id")
     csrf_token = get_csrf_token(db, session_token) if session_token else None
@@ -132,7 +133,7 @@ async def get_me(request: Request, user: Optional[User] = Depends(get_current_us
     if session_token and not csrf_token:
         csrf_token = generate_csrf_token(db, session_token)
     
-    response = JSONResponse({
+    response = ORJSONResponse({
         "user": {"id": user.id, "username": user.username},
         "csrf_token": csrf_token
     })
@@ -156,11 +157,11 @@ async def get_me(request: Request, user: Optional[User] = Depends(get_current_us
 async def get_csrf_token_endpoint(request: Request, user: Optional[User] = Depends(get_current_user), db: Session = Depends(get_db)):
     """Получить CSRF токен для текущей сессии"""
     if not user:
-        return JSONResponse({"csrf_token": None}, status_code=401)
+        return ORJSONResponse({"csrf_token": None}, status_code=401)
     
     session_token = request.cookies.get("session_id")
     if not session_token:
-        return JSONResponse({"csrf_token": None}, status_code=401)
+        return ORJSONResponse({"csrf_token": None}, status_code=401)
     
     csrf_token = get_csrf_token(db, session_token)
     
@@ -168,7 +169,7 @@ async def get_csrf_token_endpoint(request: Request, user: Optional[User] = Depen
     if not csrf_token:
         csrf_token = generate_csrf_token(db, session_token)
     
-    response = JSONResponse({"csrf_token": csrf_token})
+    response = ORJSONResponse({"csrf_token": csrf_token})
     # Обновляем cookie с CSRF токеном
     response.set_cookie(
         key="csrf_token",
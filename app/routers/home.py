@@ -1,21 +1,30 @@
 # app/routers/home.py
+import logging
+import httpx
 from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from typing import Optional
 
 from app.db.models import User
 from app.auth import get_current_user
 from app.services.recipe_service import generate_recipe_text
+from app.templating import templates
+from app.config import TEMPLATES_AUTO_RELOAD
 
 router = APIRouter()
 
-templates = Jinja2Templates(directory="app/templates")
+# Главная страница для гостя одинакова для всех — рендерим один раз
+# (только без auto_reload: иначе правки шаблона и статики не были бы видны)
+_anonymous_index: Optional[str] = None
 
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request, user: Optional[User] = Depends(get_current_user)):
-    return templates.TemplateResponse(
+    global _anonymous_index
+    if user is None and _anonymous_index is not None:
+        return HTMLResponse(_anonymous_index)
+    
+    response = templates.TemplateResponse(
         "index.html",
         {
             "request": request,
@@ -23,11 +32,28 @@ async def home(request: Request, user: Optional[User] = Depends(get_current_user
             "user": user.username if user else None
         }
     )
+    if user is None and not TEMPLATES_AUTO_RELOAD:
+        _anonymous_index = response.body.decode()
+    return response
 
 
 @router.post("/", response_class=HTMLResponse)
 async def generate_recipe(request: Request, chat_input: str = Form(...)):
-    recipe_text = await generate_recipe_text(chat_input)
+    try:
+        recipe_text = await generate_recipe_text(chat_input)
+    except httpx.HTTPError as e:
+        # Для HTML-формы — страница с ошибкой, а не JSON из общего обработчика
+        logging.warning("Ошибка запроса в n8n: %s", e)
+        return templates.TemplateResponse(
+            "index.html",
+            {
+                "request": request,
+                "recipe": None,
+                "chat_input": chat_input,
+                "error": "Сервис генерации рецептов недоступен. Попробуйте ещё раз позже."
+            },
+            status_code=502
+        )
 
     return templates.TemplateResponse(
         "index.html",
@@ -1,15 +1,53 @@
 # app/routers/recipes.py
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import RowMapping, bindparam, delete, select, update
 from sqlalchemy.orm import Session
+from typing import Iterable, Iterator, Optional
 
 from app.db.models import get_db, User, Recipe
 from app.auth import require_auth
 from app.schemas import RecipeRequest, RecipeCreate, RecipeUpdate
 from app.services.recipe_service import generate_recipe_text
+from app.responses import ORJSONResponse, dumps
 
 router = APIRouter()
 
+# Сколько рецептов сериализуется в один кусок потокового ответа (совпадает с yield_per)
+STREAM_BATCH_SIZE = 100
+
+# Максимальный размер страницы списка рецептов
+MAX_PAGE_SIZE = 1000
+
+# Рецепт пользователя по id: запрос собирается один раз, значения передаются через bindparam
+_RECIPE_BY_OWNER_STMT = select(
+    Recipe.id,
+    Recipe.title,
+    Recipe.content,
+    Recipe.original_query,
+    Recipe.created_at,
+    Recipe.updated_at
+).where(
+    Recipe.id == bindparam("recipe_id"),
+    Recipe.user_id == bindparam("user_id")
+)
+
+
+def _stream_recipes(rows: Iterable[RowMapping]) -> Iterator[bytes]:
+    """Потоковая выдача {"recipes": [...]}: в памяти только текущая пачка строк"""
+    yield b'{"recipes":['
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(dumps(dict(row)))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield (b"" if first else b",") + b",".join(batch)
+            batch.clear()
+            first = False
+    if batch:
+        yield (b"" if first else b",") + b",".join(batch)
+    yield b"]}"
+
 
 @router.post("/api/recipe")
 async def api_generate_recipe(payload: RecipeRequest):
@@ -17,7 +55,7 @@ async def api_generate_recipe(payload: RecipeRequest):
     JSON API для Vue-фронтенда.
     """
     recipe_text = await generate_recipe_text(payload.chat_input)
-    return JSONResponse({"recipe": recipe_text})
+    return ORJSONResponse({"recipe": recipe_text})
 
 
 @router.post("/api/recipes")
@@ -35,37 +73,39 @@ async def create_recipe(
     )
     db.add(new_recipe)
     db.commit()
-    db.refresh(new_recipe)
     
-    return JSONResponse({
+    return ORJSONResponse({
         "id": new_recipe.id,
         "title": new_recipe.title,
         "content": new_recipe.content,
-        "created_at": new_recipe.created_at.isoformat()
+        "created_at": new_recipe.created_at
     })
 
 
 @router.get("/api/recipes")
 async def get_recipes(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
     user: User = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
-    """Получить все рецепты пользователя"""
-    recipes = db.query(Recipe).filter(Recipe.user_id == user.id).order_by(Recipe.created_at.desc()).all()
+    """Получить рецепты пользователя (все или страницу limit/offset)"""
+    # Выбираем только нужные колонки: строки без создания ORM-объектов, порциями по 100
+    stmt = select(
+        Recipe.id,
+        Recipe.title,
+        Recipe.content,
+        Recipe.original_query,
+        Recipe.created_at,
+        Recipe.updated_at
+    ).where(
+        Recipe.user_id == user.id
+    ).order_by(
+        # id — для стабильного порядка между страницами при одинаковом created_at
+        Recipe.created_at.desc(), Recipe.id.desc()
+    ).limit(limit).offset(offset or None).execution_options(yield_per=STREAM_BATCH_SIZE)
     
-    return JSONResponse({
-        "recipes": [
-            {
-                "id": r.id,
-                "title": r.title,
-                "content": r.content,
-                "original_query": r.original_query,
-                "created_at": r.created_at.isoformat(),
-                "updated_at": r.updated_at.isoformat()
-            }
-            for r in recipes
-        ]
-    })
+    return StreamingResponse(_stream_recipes(db.execute(stmt).mappings()), media_type="application/json")
 
 
 @router.get("/api/recipes/{recipe_id}")
@@ -75,18 +115,13 @@ async def get_recipe(
     db: Session = Depends(get_db)
 ):
     """Получить конкретный рецепт"""
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id, Recipe.user_id == user.id).first()
+    recipe = db.execute(
+        _RECIPE_BY_OWNER_STMT, {"recipe_id": recipe_id, "user_id": user.id}
+    ).mappings().first()
     if not recipe:
         raise HTTPException(status_code=404, detail="Рецепт не найден")
     
-    return JSONResponse({
-        "id": recipe.id,
-        "title": recipe.title,
-        "content": recipe.content,
-        "original_query": recipe.original_query,
-        "created_at": recipe.created_at.isoformat(),
-        "updated_at": recipe.updated_at.isoformat()
-    })
+    return ORJSONResponse(dict(recipe))
 
 
 @router.put("/api/recipes/{recipe_id}")
@@ -97,24 +132,25 @@ async def update_recipe(
     db: Session = Depends(get_db)
 ):
     """Обновить рецепт"""
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id, Recipe.user_id == user.id).first()
-    if not recipe:
-        raise HTTPException(status_code=404, detail="Рецепт не найден")
+    changes = recipe_data.model_dump(exclude_none=True)
+    owned = (Recipe.id == recipe_id, Recipe.user_id == user.id)
+    columns = (Recipe.id, Recipe.title, Recipe.content, Recipe.updated_at)
+    
+    # Один UPDATE ... RETURNING вместо SELECT + UPDATE; без изменений — только чтение
+    if changes:
+        stmt = update(Recipe).where(*owned).values(**changes).returning(*columns).execution_options(
+            synchronize_session=False
+        )
+    else:
+        stmt = select(*columns).where(*owned)
     
-    if recipe_data.title is not None:
-        recipe.title = recipe_data.title
-    if recipe_data.content is not None:
-        recipe.content = recipe_data.content
+    row = db.execute(stmt).mappings().first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Рецепт не найден")
     
     db.commit()
-    db.refresh(recipe)
     
-    return JSONResponse({
-        "id": recipe.id,
-        "title": recipe.title,
-        "content": recipe.content,
-        "updated_at": recipe.updated_at.isoformat()
-    })
+    return ORJSONResponse(dict(row))
 
 
 @router.delete("/api/recipes/{recipe_id}")
@@ -124,11 +160,14 @@ async def delete_recipe(
     db: Session = Depends(get_db)
 ):
     """Удалить рецепт"""
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id, Recipe.user_id == user.id).first()
-    if not recipe:
+    # Один DELETE ... RETURNING вместо SELECT + DELETE
+    deleted_id = db.execute(
+        delete(Recipe).where(Recipe.id == recipe_id, Recipe.user_id == user.id).returning(Recipe.id),
+        execution_options={"synchronize_session": False}
+    ).scalar()
+    if deleted_id is None:
         raise HTTPException(status_code=404, detail="Рецепт не найден")
     
-    db.delete(recipe)
     db.commit()
     
-    return JSONResponse({"message": "Рецепт удалён"})
+    return ORJSONResponse({"message": "Рецепт удалён"})
@@ -1,7 +1,11 @@
 # app/schemas.py
+import re
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 
+# Допустимые символы имени пользователя (один скомпилированный шаблон на все модели)
+_USERNAME_RE = re.compile(r'[a-zA-Z0-9_]+')
+
 
 class RecipeRequest(BaseModel):
     chat_input: str
@@ -19,20 +23,24 @@ class RecipeUpdate(BaseModel):
 
 
 class UserRegister(BaseModel):
-    username: str = Field(..., min_length=3, max_length=50, pattern="^[a-zA-Z0-9_]+$")
+    username: str = Field(..., min_length=3, max_length=50)
     password: str = Field(..., min_length=8, max_length=128)
     
     @field_validator('username')
     @classmethod
     def validate_username(cls, v: str) -> str:
-        if not v.strip():
+        # isspace() проверяет строку без создания копии, в отличие от strip()
+        if not v or v.isspace():
             raise ValueError("Имя пользователя не может быть пустым")
-        return v.strip()
+        if not _USERNAME_RE.fullmatch(v):
+            raise ValueError("Имя пользователя может содержать только латинские буквы, цифры и _")
+        # Пробелы шаблон не пропускает, поэтому значение уже без пробелов по краям
+        return v
     
     @field_validator('password')
     @classmethod
     def validate_password(cls, v: str) -> str:
-        if not v.strip():
+        if not v or v.isspace():
             raise ValueError("Пароль не может быть пустым")
         return v
 
@@ -1,17 +1,102 @@
 # app/services/recipe_service.py
 import httpx
-import uuid
+import msgspec
+import orjson
+import secrets
 import re
+import html
 import logging
-from typing import cast
+from typing import Optional, cast
 from app.config import N8N_WEBHOOK_URL
 
+logger = logging.getLogger(__name__)
+
+# Регулярные выражения для очистки HTML (компилируются один раз при импорте)
+_BR_RE = re.compile(r'<br\s*/?>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# URL webhook n8n: наличие проверяется в app.config при старте, здесь только фиксируем тип
+_WEBHOOK_URL = cast(str, N8N_WEBHOOK_URL)
+
+# Заголовки запроса в n8n: тело сериализуется orjson заранее и передаётся байтами
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Общий HTTP-клиент для запросов в n8n: соединения (TCP/TLS) переиспользуются между запросами
+_client: httpx.AsyncClient | None = None
+
+
+def _create_client() -> httpx.AsyncClient:
+    # Без таймаута на чтение для долгих запросов, но соединение с n8n не ждём бесконечно
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(None, connect=10.0),
+        # Простаивающие соединения держим минуту (по умолчанию 5 с), чтобы между
+        # редкими запросами генерации не терять уже установленное соединение
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=100, keepalive_expiry=60.0),
+    )
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Получить общий HTTP-клиент (создаётся при первом обращении, если не был создан при старте)"""
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+async def init_client() -> None:
+    """Создать HTTP-клиент при старте приложения"""
+    _get_client()
+
+
+async def close_client() -> None:
+    """Закрыть HTTP-клиент и его соединения при остановке приложения"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class _N8nOutput(msgspec.Struct):
+    output: Optional[str] = None
+
+
+class _N8nItem(msgspec.Struct):
+    output: Optional[str] = None
+    # n8n иногда заворачивает ответ в json: { "json": { "output": "..." } }.
+    # Поле не разбирается сразу: его форма важна, только если output нет
+    json: msgspec.Raw = msgspec.Raw()
+
+
+# Ожидаемая форма ответа n8n: [ { "output": "..." } ] (или один объект без списка).
+# msgspec разбирает и проверяет типы за один проход, лишние поля пропускает
+_N8N_RESPONSE_DECODER = msgspec.json.Decoder(list[_N8nItem] | _N8nItem)
+_N8N_OUTPUT_DECODER = msgspec.json.Decoder(_N8nOutput)
+
+
+def _decode_output(content: bytes) -> str:
+    """
+    Текст рецепта из тела ответа n8n.
+    ValueError (msgspec.DecodeError/ValidationError), если это не JSON или структура неожиданная:
+    вместо repr всего ответа — короткое сообщение с путём до ошибки
+    """
+    response = _N8N_RESPONSE_DECODER.decode(content)
+    item = response[0] if isinstance(response, list) and response else response
+    if isinstance(item, _N8nItem):
+        if item.output is not None:
+            return item.output
+        if item.json:
+            wrapped = _N8N_OUTPUT_DECODER.decode(item.json)
+            if wrapped.output is not None:
+                return wrapped.output
+    raise ValueError("в ответе нет поля output")
+
 
 async def generate_recipe_text(chat_input: str) -> str:
     """
     Вспомогательная функция для запроса в n8n и получения текста рецепта.
     """
-    session_id = uuid.uuid4().hex
+    session_id = secrets.token_hex(16)
 
     # Формируем список объектов как требует n8n
     payload = [
@@ -22,58 +107,33 @@ async def generate_recipe_text(chat_input: str) -> str:
         }
     ]
 
-    # отладочная информация
-    logging.info("Payload отправляется в n8n: %s", payload)
-    
-    # Проверка наличия URL (должен быть установлен при старте приложения)
-    if not N8N_WEBHOOK_URL:
-        raise RuntimeError("N8N_WEBHOOK_URL не установлен")
-    
-    # Type assertion: после проверки N8N_WEBHOOK_URL гарантированно str
-    webhook_url = cast(str, N8N_WEBHOOK_URL)
+    # отладочная информация (repr payload строится только при включённом DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Payload отправляется в n8n: %s", payload)
     
+    resp = await _get_client().post(_WEBHOOK_URL, content=orjson.dumps(payload), headers=_JSON_HEADERS)
+    # Отладочный вывод ответа только при включённом DEBUG; для превью декодируем
+    # первые 500 байт, а не всё тело (resp.text)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Status=%s len=%d", resp.status_code, len(resp.content))
+        logger.debug("Raw body: %s", resp.content[:500].decode('utf-8', 'replace'))
+        logger.debug("Headers: %s", resp.headers)
+    # Ошибки n8n (сеть, статус, некорректный ответ) — httpx.HTTPError, приложение отвечает 502
+    resp.raise_for_status()
     try:
-        # Убираем таймаут для долгих запросов
-        async with httpx.AsyncClient(timeout=None) as client:
-            resp = await client.post(webhook_url, json=payload)
-            logging.info("Status code: %s", resp.status_code)
-            logging.info("Raw body: %s", resp.text[:500])
-            logging.info("Headers: %s", resp.headers)
-            resp.raise_for_status()
-            try:
-                data = resp.json()
-            except ValueError as ve:
-                logging.error("Ошибка разбора JSON: %s", ve)
-                raise
-            # ожидаем список с одним объектом вида:
-            # [ { "output": "..." } ]
-            if isinstance(data, list) and data:
-                first = data[0]
-                if isinstance(first, dict):
-                    # самый частый и желаемый формат
-                    if "output" in first and isinstance(first["output"], str):
-                        recipe_text = first["output"]
-                    # запасной вариант, если n8n завернул в json: { "json": { "output": "..." } }
-                    elif "json" in first and isinstance(first["json"], dict) and "output" in first["json"]:
-                        recipe_text = str(first["json"]["output"])
-                    else:
-                        recipe_text = str(first)
-                else:
-                    recipe_text = str(first)
-            elif isinstance(data, dict):
-                recipe_text = data.get("output", str(data))
-            else:
-                recipe_text = str(data)
-            
-            # Очищаем HTML теги и заменяем <br> на переводы строк
-            if isinstance(recipe_text, str):
-                # Заменяем <br>, <br/>, <br /> на переводы строк
-                recipe_text = re.sub(r'<br\s*\/?>', '\n', recipe_text, flags=re.IGNORECASE)
-                # Удаляем другие HTML теги
-                recipe_text = re.sub(r'<[^>]+>', '', recipe_text)
-                # Декодируем HTML entities если есть
-                recipe_text = recipe_text.replace('&nbsp;', ' ').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
-    except Exception as e:
-        recipe_text = f"Ошибка: {str(e)}"
+        recipe_text = _decode_output(resp.content)
+    except ValueError as ve:
+        raise httpx.DecodingError(f"Некорректный ответ n8n: {ve}", request=resp.request) from ve
+    
+    # Регулярные выражения запускаем, только если в тексте вообще есть теги
+    # (проверка `in` — один быстрый проход на C; простой текст без HTML их пропускает)
+    if '<' in recipe_text:
+        # Заменяем <br>, <br/>, <br /> на переводы строк
+        recipe_text = _BR_RE.sub('\n', recipe_text)
+        # Удаляем другие HTML теги
+        recipe_text = _TAG_RE.sub('', recipe_text)
+    # Декодируем HTML entities за один проход (&nbsp; оставляем обычным пробелом).
+    # html.unescape сразу возвращает строку без '&' без изменений
+    recipe_text = html.unescape(recipe_text).replace('\xa0', ' ')
 
     return recipe_text
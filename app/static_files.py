@@ -0,0 +1,40 @@
+# app/static_files.py
+import os
+import pathlib
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import QueryParams
+from starlette.responses import Response
+from starlette.types import Scope
+
+# Папка со статическими файлами
+STATIC_DIR = pathlib.Path(__file__).parent / "static"
+
+# Версионированный URL никогда не меняет содержимое — кэшируем на год
+VERSIONED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Без версии браузер перепроверяет файл (ETag / Last-Modified -> 304)
+UNVERSIONED_CACHE_CONTROL = "no-cache"
+
+
+def static_url(path: str) -> str:
+    """URL статического файла с версией по времени изменения (после правки файла URL меняется)"""
+    mtime = (STATIC_DIR / path).stat().st_mtime_ns
+    return f"/static/{path}?v={mtime:x}"
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с заголовком Cache-Control"""
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if "v" in QueryParams(scope["query_string"]):
+            response.headers["Cache-Control"] = VERSIONED_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = UNVERSIONED_CACHE_CONTROL
+        return response
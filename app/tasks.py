@@ -0,0 +1,51 @@
+# app/tasks.py
+import asyncio
+import logging
+
+from app.db.models import SessionLocal
+from app.auth import cleanup_expired_sessions
+
+# Интервал между очистками истёкших сессий (секунды)
+CLEANUP_INTERVAL = 300
+
+# Фоновая задача очистки (None, пока приложение не запущено)
+_cleanup_task: asyncio.Task | None = None
+
+
+def _cleanup_sessions() -> None:
+    """Одна очистка истёкших сессий в отдельной сессии БД"""
+    db = SessionLocal()
+    try:
+        cleanup_expired_sessions(db)
+    finally:
+        db.close()
+
+
+async def _cleanup_sessions_loop() -> None:
+    """Периодическая очистка сессий вне обработки запросов"""
+    while True:
+        try:
+            # DELETE выполняется в потоке, чтобы не блокировать event loop
+            await asyncio.to_thread(_cleanup_sessions)
+        except Exception:
+            logging.exception("Ошибка очистки истёкших сессий")
+        await asyncio.sleep(CLEANUP_INTERVAL)
+
+
+async def start_session_cleanup() -> None:
+    """Запустить фоновую очистку сессий при старте приложения"""
+    global _cleanup_task
+    if _cleanup_task is None:
+        _cleanup_task = asyncio.create_task(_cleanup_sessions_loop())
+
+
+async def stop_session_cleanup() -> None:
+    """Остановить фоновую очистку сессий при остановке приложения"""
+    global _cleanup_task
+    if _cleanup_task is not None:
+        _cleanup_task.cancel()
+        try:
+            await _cleanup_task
+        except asyncio.CancelledError:
+            pass
+        _cleanup_task = None
@@ -0,0 +1,14 @@
+# app/templating.py
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+from app.config import TEMPLATES_AUTO_RELOAD
+from app.static_files import static_url
+
+# Единое окружение Jinja для всего приложения (один кэш скомпилированных шаблонов)
+templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_url
+templates.env.auto_reload = TEMPLATES_AUTO_RELOAD
+# Скомпилированные шаблоны сохраняются на диск (во временную папку пользователя)
+# и переиспользуются после перезапуска воркеров, без повторного разбора
+templates.env.bytecode_cache = FileSystemBytecodeCache()
@@ -1,17 +1,3 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
-app = FastAPI()
-
-# Allow all origins for simplicity. Adjust in production.
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
-async def read_root():
-    return {"message": "Hello, World from FastAPI!"}
+# backend/main.py
+# Совместимость со старой точкой входа (uvicorn backend.main:app): то же приложение, что и app.main
+from app.main import app  # noqa: F401